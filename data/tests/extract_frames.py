@@ -2,22 +2,28 @@ import os
 import cv2
 import argparse
 
-def extract_frames(video_path: str, output_dir: str, interval: int = 15):
+def extract_frames(video_path: str, output_dir: str, interval: int = 15, quality: int = 95):
     os.makedirs(output_dir, exist_ok=True)
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise IOError(f"Cannot open video: {video_path}")
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
     frame_idx = 0
     saved = 0
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        # grab() only demuxes/decodes; the BGR conversion in retrieve() is
+        # paid for the frames we actually keep
+        if not cap.grab():
             break
 
         if frame_idx % interval == 0:
-            out_path = os.path.join(output_dir, f"frame_{frame_idx:06d}.png")
-            cv2.imwrite(out_path, frame)
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            out_path = os.path.join(output_dir, f"frame_{frame_idx:06d}.jpg")
+            cv2.imwrite(out_path, frame, [cv2.IMWRITE_JPEG_QUALITY, quality,
+                                          cv2.IMWRITE_JPEG_OPTIMIZE, 0])
             saved += 1
 
         frame_idx += 1
@@ -38,6 +44,10 @@ if __name__ == "__main__":
         "-n", "--interval", type=int, default=15,
         help="Frame interval (every Nth frame is saved)"
     )
+    parser.add_argument(
+        "-q", "--quality", type=int, default=95,
+        help="JPEG quality of saved frames (0-100)"
+    )
     args = parser.parse_args()
 
-    extract_frames(args.video, args.output, args.interval)
+    extract_frames(args.video, args.output, args.interval, args.quality)
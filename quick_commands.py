@@ -1,12 +1,17 @@
 # quick_commands.py
 
+import os
 import subprocess
 import sys
 from pathlib import Path
 
-def run_cmd(cmd):
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from file_utils import FRAME_EXTENSIONS, VIDEO_EXTENSIONS, count_files
+
+def run_cmd(argv):
     """Execute command and show output"""
-    result = subprocess.run(cmd, shell=True)
+    # Exec the script directly with this interpreter; no intermediate shell
+    result = subprocess.run([sys.executable] + argv)
     return result.returncode == 0
 
 def main():
@@ -37,72 +42,75 @@ Examples:
     args = sys.argv[2:]
 
     if cmd == "extract":
-        base_cmd = "python scripts/1_extract_frames.py"
+        base_cmd = ["scripts/1_extract_frames.py"]
         if "--skip" in args:
             idx = args.index("--skip")
-            base_cmd += f" --frame-skip {args[idx+1]}"
+            base_cmd += ["--frame-skip", args[idx+1]]
         if "--random" in args:
-            base_cmd += " --randomize"
+            base_cmd.append("--randomize")
         run_cmd(base_cmd)
 
     elif cmd == "upload":
-        run_cmd("python scripts/2_upload_to_gcs.py")
+        run_cmd(["scripts/2_upload_to_gcs.py"])
 
     elif cmd == "import":
-        base_cmd = "python scripts/3_import_to_labelstudio.py"
+        base_cmd = ["scripts/3_import_to_labelstudio.py"]
         if "--keep" in args:
-            base_cmd += " --keep-existing"
+            base_cmd.append("--keep-existing")
         run_cmd(base_cmd)
 
     elif cmd == "nuke":
-        run_cmd("python scripts/nuke.py")
+        run_cmd(["scripts/nuke.py"])
 
     elif cmd == "sanitize":
-        base_cmd = "python scripts/sanitize.py"
+        base_cmd = ["scripts/sanitize.py"]
         if args:
-            base_cmd += f" {args[0]}"
+            base_cmd.append(args[0])
         run_cmd(base_cmd)
 
     elif cmd == "export":
-        run_cmd("python scripts/4_export_annotations.py")
+        run_cmd(["scripts/4_export_annotations.py"])
 
     elif cmd == "split":
-        run_cmd("python scripts/5_split_dataset.py")
+        run_cmd(["scripts/5_split_dataset.py"])
 
     elif cmd == "train":
-        run_cmd("python scripts/6_train_model.py train")
+        run_cmd(["scripts/6_train_model.py", "train"])
 
     elif cmd == "test":
         if args:
-            run_cmd(f"python scripts/7_test_model.py --source {args[0]} --save-images")
+            run_cmd(["scripts/7_test_model.py", "--source", args[0], "--save-images"])
         else:
             print("❌ Provide image path: python quick_commands.py test <path>")
 
     elif cmd == "pipeline":
-        run_cmd("python scripts/pipeline.py")
+        run_cmd(["scripts/pipeline.py"])
 
     elif cmd == "status":
         print("📊 Pipeline Status:")
 
         # Check videos
-        videos = list(Path("data/videos").glob("*.mp4"))
-        print(f"Videos: {len(videos)} found")
+        videos = count_files("data/videos", VIDEO_EXTENSIONS)
+        print(f"Videos: {videos} found")
 
         # Check frames
-        frames = list(Path("data/frames").rglob("*.png"))
-        print(f"Frames: {len(frames)} extracted")
+        frames = count_files("data/frames", FRAME_EXTENSIONS, recursive=True)
+        print(f"Frames: {frames} extracted")
 
         # Check exports
-        exports = list(Path("data/annotations").glob("export_*"))
+        exports = []
+        if os.path.isdir("data/annotations"):
+            with os.scandir("data/annotations") as entries:
+                exports = [e.path for e in entries if e.name.startswith("export_") and e.is_dir()]
         print(f"Exports: {len(exports)} available")
 
         # Check models
-        models = list(Path("models").glob("*.pt"))
-        print(f"Models: {len(models)} trained")
+        models = count_files("models", ".pt")
+        print(f"Models: {models} trained")
 
         # Check latest export structure
         if exports:
-            latest = sorted(exports)[-1]
+            latest = Path(max(exports))
             has_split = (latest / "train").exists() and (latest / "val").exists()
             print(f"Latest export split: {'✅' if has_split else '❌'}")
 
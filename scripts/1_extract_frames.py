@@ -1,86 +1,370 @@
 # scripts/1_extract_frames.py
 
+import os
 import cv2
-import yaml
+import numpy as np
 import random
 import argparse
+import queue
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from tqdm import tqdm
+from pipeline_config import get_config
+from file_utils import VIDEO_EXTENSIONS
 
-def extract_frames(video_path, output_dir, fps=2, frame_skip=1, video_index=1):
-    """Extract frames from video with optional frame skipping"""
+try:
+    from turbojpeg import TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+def scaled_size(width, height, max_side=0):
+    """Size that fits within max_side on the longest edge (0 keeps full size)"""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    # Even dimensions keep NV12/YUV420 surfaces valid
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+def _open_cv2(video_path, max_side=0):
+    """Open video with OpenCV's CPU (FFmpeg) decoder"""
     cap = cv2.VideoCapture(str(video_path))
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
     fps_video = cap.get(cv2.CAP_PROP_FPS)
-    frame_interval = int(fps_video / fps)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    out_size = scaled_size(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), max_side)
 
-    output_dir.mkdir(parents=True, exist_ok=True)
-    frame_count = 0
-    saved_count = 0
+    def read_frames(keep):
+        frame_idx = 0
+        try:
+            # Checked once; grab() failing is what ends the loop
+            if not cap.isOpened():
+                return
+            while True:
+                # grab() decodes without the BGR conversion; retrieve() only for kept frames
+                if not cap.grab():
+                    break
+                if keep(frame_idx):
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    if frame.shape[1::-1] != out_size:
+                        frame = cv2.resize(frame, out_size, interpolation=cv2.INTER_AREA)
+                    yield frame_idx, frame
+                frame_idx += 1
+        finally:
+            cap.release()
 
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    pbar = tqdm(total=total_frames, desc=f"Processing CR_{video_index}")
+    return fps_video, total_frames, read_frames
+
+def _open_pyav(video_path, max_side=0):
+    """Open video with PyAV (FFmpeg with frame-level threading)"""
+    try:
+        import av
+    except ImportError:
+        raise ImportError("pyav backend requires PyAV: pip install av")
+
+    container = av.open(str(video_path))
+    stream = container.streams.video[0]
+    stream.thread_type = "AUTO"
+    fps_video = float(stream.average_rate or 0)
+    total_frames = stream.frames
+    out_width, out_height = scaled_size(stream.codec_context.width,
+                                        stream.codec_context.height, max_side)
+
+    def read_frames(keep):
+        try:
+            for frame_idx, frame in enumerate(container.decode(stream)):
+                if keep(frame_idx):
+                    # swscale resizes and converts to BGR in one pass
+                    frame = frame.reformat(width=out_width, height=out_height, format="bgr24")
+                    yield frame_idx, frame.to_ndarray()
+        finally:
+            container.close()
+
+    return fps_video, total_frames, read_frames
+
+def _has_cudacodec():
+    """True if this OpenCV build has NVDEC (cudacodec) and a CUDA device"""
+    try:
+        return hasattr(cv2, 'cudacodec') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except cv2.error:
+        return False
+
+def _open_cudacodec(video_path, max_side=0):
+    """Open video with NVDEC via OpenCV's cudacodec; only kept frames leave the GPU"""
+    # Read metadata through the CPU backend; it doesn't decode anything
+    probe = cv2.VideoCapture(str(video_path))
+    fps_video = probe.get(cv2.CAP_PROP_FPS)
+    total_frames = int(probe.get(cv2.CAP_PROP_FRAME_COUNT))
+    source_size = (int(probe.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                   int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    probe.release()
+    out_size = scaled_size(*source_size, max_side)
+
+    reader = cv2.cudacodec.createVideoReader(str(video_path))
+
+    def read_frames(keep):
+        frame_idx = 0
+        while True:
+            ok, gpu_frame = reader.nextFrame()
+            if not ok:
+                break
+            if keep(frame_idx):
+                # Resize and drop alpha on the GPU, then download the small frame
+                if out_size != source_size:
+                    gpu_frame = cv2.cuda.resize(gpu_frame, out_size, interpolation=cv2.INTER_AREA)
+                yield frame_idx, cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGRA2BGR).download()
+            frame_idx += 1
+
+    return fps_video, total_frames, read_frames
+
+def _open_nvdec(video_path, max_side=0, gpu_id=0):
+    """Open video with NVDEC via VPF; only kept frames leave the GPU"""
+    try:
+        import PyNvCodec as nvc
+    except ImportError:
+        if _has_cudacodec():
+            return _open_cudacodec(video_path, max_side)
+        raise ImportError("nvdec backend requires VPF (PyNvCodec): "
+                          "https://github.com/NVIDIA/VideoProcessingFramework "
+                          "or OpenCV built with CUDA (cudacodec)")
+
+    decoder = nvc.PyNvDecoder(str(video_path), gpu_id)
+    source_size = (decoder.Width(), decoder.Height())
+    width, height = scaled_size(*source_size, max_side)
+    # Downscale on the GPU before colour conversion and the PCIe download
+    resizer = (nvc.PySurfaceResizer(width, height, nvc.PixelFormat.NV12, gpu_id)
+               if (width, height) != source_size else None)
+    to_rgb = nvc.PySurfaceConverter(width, height, nvc.PixelFormat.NV12,
+                                    nvc.PixelFormat.RGB, gpu_id)
+    cc_ctx = nvc.ColorspaceConversionContext(decoder.ColorSpace(), decoder.ColorRange())
+    downloader = nvc.PySurfaceDownloader(width, height, nvc.PixelFormat.RGB, gpu_id)
+
+    def read_frames(keep):
+        # Single host buffer reused for every downloaded frame
+        frame_buffer = np.empty(width * height * 3, dtype=np.uint8)
+        frame_idx = 0
+        while True:
+            surface = decoder.DecodeSingleSurface()
+            if surface.Empty():
+                break
+            if keep(frame_idx):
+                if resizer is not None:
+                    surface = resizer.Execute(surface)
+                rgb_surface = to_rgb.Execute(surface, cc_ctx)
+                if rgb_surface.Empty() or not downloader.DownloadSingleSurface(rgb_surface, frame_buffer):
+                    break
+                yield frame_idx, cv2.cvtColor(frame_buffer.reshape(height, width, 3), cv2.COLOR_RGB2BGR)
+            frame_idx += 1
+
+    return decoder.Framerate(), decoder.Numframes(), read_frames
+
+DECODERS = {
+    'cv2': _open_cv2,
+    'pyav': _open_pyav,
+    'nvdec': _open_nvdec,
+}
+
+def open_video(video_path, backend='cv2', max_side=0):
+    """Open video with the given decoder backend
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
+    Returns (fps, total_frames, read_frames) where read_frames(keep) yields
+    (frame_idx, frame) as BGR arrays for the frame indices keep() accepts,
+    downscaled so the longest side is at most max_side (0 = full size).
+    """
+    return DECODERS[backend](video_path, max_side)
+
+def find_videos(video_dir):
+    """List video files in video_dir in one pass, matching extensions case-insensitively"""
+    with os.scandir(video_dir) as entries:
+        return sorted(Path(e.path) for e in entries
+                      if e.is_file() and os.path.splitext(e.name)[1].lower() in VIDEO_EXTENSIONS)
+
+# Decode -> encode -> write pipeline sizing
+ENCODE_WORKERS = 4
+QUEUE_SIZE = 8
+# Concurrent NVDEC sessions beyond this just contend for the same engine
+NVDEC_MAX_WORKERS = 2
+
+def encode_settings(image_format='jpg', quality=95):
+    """Return (extension, cv2 encode params) for the frame output format"""
+    if image_format == 'png':
+        # Lossless opt-in: fastest zlib level, RLE strategy for flat game UI regions
+        return '.png', [cv2.IMWRITE_PNG_COMPRESSION, 1,
+                        cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_RLE]
+    # JPEG encode is far cheaper than PNG deflate; skip the extra Huffman pass
+    return '.jpg', [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+
+def frame_encoder(extension, encode_params, quality=95):
+    """Return a frame -> image bytes function (None on failure)"""
+    if extension == '.jpg' and TurboJPEG is not None:
+        # libjpeg-turbo called directly skips OpenCV's encode wrapper;
+        # fall back to cv2 if the shared library can't be loaded
+        try:
+            jpeg = TurboJPEG()
+            return lambda frame: jpeg.encode(frame, quality=quality)
+        except (OSError, RuntimeError):
+            pass
+
+    def encode(frame):
+        ok, buffer = cv2.imencode(extension, frame, encode_params)
+        return buffer if ok else None
+    return encode
+
+def _encode_worker(encode_q, write_q, encode, errors):
+    """Encode queued frames to image bytes (both encoders release the GIL)"""
+    while True:
+        item = encode_q.get()
+        if item is None:
             break
+        output_path, frame = item
+        try:
+            buffer = encode(frame)
+            if buffer is None:
+                raise IOError(f"Failed to encode {output_path.name}")
+            write_q.put((output_path, buffer))
+        except Exception as e:
+            # Keep draining so the decoder never blocks on a full queue
+            errors.append(e)
 
-        if frame_count % frame_interval == 0:
-            # Apply frame skipping - only save every nth frame that would be extracted
-            if saved_count % frame_skip == 0:
-                output_path = output_dir / f"CR_{video_index}_{saved_count:05d}.png"
-                cv2.imwrite(str(output_path), frame)
-            saved_count += 1
+def _write_worker(write_q, errors):
+    """Write encoded frames to disk, returning how many were written"""
+    written = 0
+    while True:
+        item = write_q.get()
+        if item is None:
+            break
+        output_path, buffer = item
+        try:
+            with open(output_path, 'wb') as f:
+                f.write(buffer)
+            written += 1
+        except Exception as e:
+            errors.append(e)
+    return written
+
+def extract_frames(video_path, output_dir, fps=2, frame_skip=1, video_index=1, quality=95,
+                   backend='cv2', position=0, image_format='jpg', max_side=0):
+    """Extract frames from video with optional frame skipping"""
+    fps_video, total_frames, read_frames = open_video(video_path, backend, max_side)
+    frame_interval = max(1, int(fps_video / fps))
+    # Apply frame skipping - only save every nth frame that would be extracted
+    save_interval = frame_interval * frame_skip
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    extension, encode_params = encode_settings(image_format, quality)
 
-        frame_count += 1
-        pbar.update(1)
+    # Progress advances once per kept frame (not per decoded frame) and
+    # re-renders at most twice a second
+    pbar = tqdm(total=total_frames, desc=f"Processing CR_{video_index}", position=position,
+                mininterval=0.5)
+    last_idx = -1
 
-    cap.release()
+    # Decode on this thread while encoding and disk writes run in the
+    # background; bounded queues cap the number of frames held in memory
+    encode_q = queue.Queue(maxsize=QUEUE_SIZE)
+    write_q = queue.Queue(maxsize=QUEUE_SIZE)
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=ENCODE_WORKERS + 1) as executor:
+        writer = executor.submit(_write_worker, write_q, errors)
+        # One encoder per thread; TurboJPEG handles are not shared
+        encoders = [executor.submit(_encode_worker, encode_q, write_q,
+                                    frame_encoder(extension, encode_params, quality), errors)
+                    for _ in range(ENCODE_WORKERS)]
+        try:
+            for frame_idx, frame in read_frames(lambda idx: idx % save_interval == 0):
+                saved_count = frame_idx // frame_interval
+                output_path = output_dir / f"CR_{video_index}_{saved_count:05d}{extension}"
+                encode_q.put((output_path, frame))
+
+                pbar.update(frame_idx - last_idx)
+                last_idx = frame_idx
+        finally:
+            for _ in encoders:
+                encode_q.put(None)
+            for encoder in encoders:
+                encoder.result()
+            write_q.put(None)
+            actual_saved = writer.result()
+
+    pbar.update(max(0, total_frames - 1 - last_idx))
     pbar.close()
 
+    if errors:
+        raise errors[0]
+
     # Return actual number of files saved (accounting for frame_skip)
-    actual_saved = len(list(output_dir.glob("*.png")))
     return actual_saved
 
-def randomize_filenames(directory):
+def randomize_filenames(directory, extension='.jpg'):
     """Randomize filenames in directory while keeping extensions"""
     directory = Path(directory)
-    files = list(directory.glob("*.png"))
+    files = list(directory.glob(f"*{extension}"))
 
     if not files:
         return 0
 
     print(f"🎲 Randomizing {len(files)} filenames...")
 
-    # Create list of random numbers
-    random_indices = list(range(len(files)))
-    random.shuffle(random_indices)
+    # Final names are known upfront; shuffle which file gets which name
+    final_names = [directory / f"{directory.name}_random_{i:05d}{extension}" for i in range(len(files))]
+    random.shuffle(final_names)
 
-    # Create temporary names to avoid conflicts
-    temp_names = []
+    # Only files already holding a target name (e.g. a re-run on randomized
+    # frames) need a temporary name to avoid clobbering
+    targets = {name.name for name in final_names}
+    sources = []
     for i, file_path in enumerate(files):
-        temp_name = directory / f"temp_{random_indices[i]:05d}.png"
-        file_path.rename(temp_name)
-        temp_names.append(temp_name)
+        if file_path.name in targets:
+            temp_name = directory / f"temp_{i:05d}{extension}"
+            file_path.rename(temp_name)
+            file_path = temp_name
+        sources.append(file_path)
 
-    # Rename to final randomized names
-    for i, temp_file in enumerate(temp_names):
-        final_name = directory / f"{directory.name}_random_{i:05d}.png"
-        temp_file.rename(final_name)
+    # Every target name is now free, so the renames are independent
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(Path.rename, sources, final_names))
 
     return len(files)
 
+def _extract_one(job):
+    """Worker entry point: extract (and optionally randomize) a single video"""
+    extract_kwargs, randomize = job
+
+    # Each worker decodes its own video; keep OpenCV's thread pool small so
+    # parallel workers don't oversubscribe the CPU
+    cv2.setNumThreads(2)
+
+    count = extract_frames(**extract_kwargs)
+    randomized_count = 0
+    if randomize:
+        extension, _ = encode_settings(extract_kwargs['image_format'])
+        randomized_count = randomize_filenames(extract_kwargs['output_dir'], extension)
+    return extract_kwargs['video_index'], count, randomized_count
+
 def main():
     parser = argparse.ArgumentParser(description='Extract frames from videos')
     parser.add_argument('--frame-skip', type=int, default=1,
                        help='Extract 1 frame out of every N frames (default: 1, extract all)')
     parser.add_argument('--randomize', action='store_true',
                        help='Randomize frame filenames after extraction')
+    parser.add_argument('--backend', choices=sorted(DECODERS), default='cv2',
+                       help='Video decoder: cv2 (CPU), pyav (CPU, threaded) or nvdec (NVIDIA GPU)')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                       help='Number of videos to extract in parallel (default: half the CPU cores)')
+    parser.add_argument('--format', choices=['jpg', 'png'], dest='image_format',
+                       help='Frame image format (default: extraction.format from config, jpg)')
+    parser.add_argument('--max-side', type=int,
+                       help='Downscale frames so the longest side is at most N px, 0 = full size '
+                            '(default: extraction.max_side from config)')
     args = parser.parse_args()
 
     # Load config
-    with open("configs/config.yaml") as f:
-        config = yaml.safe_load(f)
+    config = get_config()
+    image_format = args.image_format or config['extraction'].get('format', 'jpg')
+    max_side = args.max_side if args.max_side is not None else config['extraction'].get('max_side', 0)
 
     video_dir = Path("data/videos")
     frames_dir = Path("data/frames")
@@ -90,36 +374,52 @@ def main():
         return
 
     # Support multiple video formats
-    video_extensions = ["*.mp4", "*.mov", "*.MP4", "*.MOV"]
-    videos = []
-    for ext in video_extensions:
-        videos.extend(video_dir.glob(ext))
+    videos = find_videos(video_dir)
 
     if not videos:
-        print("❌ No video files found in data/videos/ (supported: .mp4, .mov, .MP4, .MOV)")
+        print(f"❌ No video files found in data/videos/ (supported: {', '.join(VIDEO_EXTENSIONS)})")
         return
 
     print(f"Found {len(videos)} videos")
     if args.frame_skip > 1:
         print(f"📊 Frame skip: extracting 1 out of every {args.frame_skip} frames")
 
-    total_extracted = 0
-    for i, video_path in enumerate(videos, 1):
-        output_dir = frames_dir / f"CR_{i}"
-        count = extract_frames(
-            video_path,
-            output_dir,
-            config['extraction']['fps'],
-            args.frame_skip,
-            i
+    workers = max(1, min(args.workers, len(videos)))
+    if args.backend == 'nvdec' and workers > NVDEC_MAX_WORKERS:
+        print(f"📉 nvdec: limiting to {NVDEC_MAX_WORKERS} parallel videos")
+        workers = NVDEC_MAX_WORKERS
+    jobs = [
+        (
+            {
+                'video_path': video_path,
+                'output_dir': frames_dir / f"CR_{i}",
+                'fps': config['extraction']['fps'],
+                'frame_skip': args.frame_skip,
+                'video_index': i,
+                'quality': config['extraction']['quality'],
+                'backend': args.backend,
+                'position': (i - 1) % workers,
+                'image_format': image_format,
+                'max_side': max_side,
+            },
+            args.randomize
         )
-        total_extracted += count
-        print(f"✓ CR_{i}: {count} frames extracted")
+        for i, video_path in enumerate(videos, 1)
+    ]
+
+    # Videos are independent (separate decoder, separate CR_{i} folder),
+    # so extract them in parallel processes
+    total_extracted = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_extract_one, job) for job in jobs]
+        for future in as_completed(futures):
+            i, count, randomized_count = future.result()
+            total_extracted += count
+            print(f"✓ CR_{i}: {count} frames extracted")
 
-        # Randomize filenames if requested
-        if args.randomize:
-            randomized_count = randomize_filenames(output_dir)
-            print(f"  🎲 Randomized {randomized_count} filenames")
+            # Randomize filenames if requested
+            if args.randomize:
+                print(f"  🎲 Randomized {randomized_count} filenames")
 
     print(f"\n✅ Total frames extracted: {total_extracted}")
     if args.randomize:
@@ -1,55 +1,117 @@
 # scripts/2_upload_to_gcs.py
 
-import yaml
+import os
 from pathlib import Path
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
+from pipeline_config import get_config
+from file_utils import FRAME_EXTENSIONS
 
-def upload_to_gcs(local_dir, bucket_name, prefix, keep_folders=True):
+def _upload_file(bucket, file_path, blob_name):
+    """Upload a single file to GCS"""
+    bucket.blob(blob_name).upload_from_filename(str(file_path))
+
+def find_frames(local_dir):
+    """Collect frame paths under local_dir in a single directory walk"""
+    return [
+        Path(root, name)
+        for root, _, names in os.walk(local_dir)
+        for name in names if name.endswith(FRAME_EXTENSIONS)
+    ]
+
+def make_storage_client(max_workers):
+    """Storage client whose HTTP session pools a kept-alive connection per upload worker"""
+    # The default session pools only 10 connections, so most of the workers
+    # would reopen a TLS connection for every upload
+    credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+    session = AuthorizedSession(credentials)
+    session.mount("https://", HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers))
+    return storage.Client(project=project, credentials=credentials, _http=session)
+
+def upload_to_gcs(local_dir, bucket_name, prefix, keep_folders=True, max_workers=32):
     """Upload directory to GCS"""
-    client = storage.Client()
+    client = make_storage_client(max_workers)
     bucket = client.bucket(bucket_name)
 
     local_dir = Path(local_dir)
-    files = list(local_dir.rglob("*.png"))
+    files = find_frames(local_dir)
 
     if not files:
-        print("❌ No PNG files found")
+        print("❌ No frame images found (supported: .jpg, .png)")
         return
 
-    print(f"Uploading {len(files)} files...")
-
-    for file_path in tqdm(files, desc="Uploading"):
+    uploads = []
+    for file_path in files:
         if keep_folders:
-            # Keep folder structure: frames/video_name/image.png
+            # Keep folder structure: frames/video_name/image.jpg
             relative_path = file_path.relative_to(local_dir)
-            blob_name = f"{prefix}{relative_path}"
+            blob_name = f"{prefix}{relative_path.as_posix()}"
         else:
-            # Flat structure: frames/image.png
+            # Flat structure: frames/image.jpg
             blob_name = f"{prefix}{file_path.name}"
+        uploads.append((file_path, blob_name))
+
+    # Skip files already uploaded with the same size (one listing instead of
+    # one exists() round-trip per file)
+    remote_sizes = {
+        blob.name: blob.size
+        for blob in client.list_blobs(bucket_name, prefix=prefix,
+                                      fields="items(name,size),nextPageToken")
+    }
+    pending = [(file_path, blob_name) for file_path, blob_name in uploads
+               if remote_sizes.get(blob_name) != file_path.stat().st_size]
+
+    skipped = len(uploads) - len(pending)
+    if skipped:
+        print(f"⏭️  Skipping {skipped} files already in GCS")
+
+    if not pending:
+        print(f"✅ Everything already uploaded to gs://{bucket_name}/{prefix}")
+        return
+
+    print(f"Uploading {len(pending)} files...")
 
-        blob = bucket.blob(blob_name)
-        blob.upload_from_filename(str(file_path))
+    # Each upload is a synchronous HTTPS request, so run many at once
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_upload_file, bucket, file_path, blob_name): file_path
+            for file_path, blob_name in pending
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Uploading"):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ Failed to upload {futures[future].name}: {e}")
 
+    if failed:
+        print(f"⚠️  {failed} files failed to upload (re-run to retry)")
     print(f"✅ Uploaded to gs://{bucket_name}/{prefix}")
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--flat', action='store_true',
                        help='Upload files flat (no folder structure)')
+    parser.add_argument('--workers', type=int, default=32,
+                       help='Number of concurrent uploads (default: 32)')
     args = parser.parse_args()
 
     # Load config
-    with open("configs/config.yaml") as f:
-        config = yaml.safe_load(f)
+    config = get_config()
 
     upload_to_gcs(
         local_dir="data/frames",
         bucket_name=config['gcs']['bucket'],
         prefix=config['gcs']['prefix'],
-        keep_folders=not args.flat
+        keep_folders=not args.flat,
+        max_workers=args.workers
     )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,27 +1,79 @@
 # scripts/3_import_to_labelstudio.py
 
-import yaml
 import argparse
+import requests
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from label_studio_sdk import Client
 from google.cloud import storage
 from datetime import datetime, timedelta
+from pipeline_config import get_config
+from file_utils import FRAME_EXTENSIONS
+
+# Tasks per import request, and concurrent import requests
+IMPORT_BATCH_SIZE = 500
+IMPORT_WORKERS = 4
+
+def _list_frame_names(bucket, prefix):
+    """List frame blob names under a prefix, fetching only the name field"""
+    blobs = bucket.list_blobs(prefix=prefix, fields="items(name),nextPageToken")
+    return [blob.name for blob in blobs if blob.name.endswith(FRAME_EXTENSIONS)]
 
 def create_signed_urls(bucket_name, prefix):
     """Create signed URLs for all images in bucket"""
     client = storage.Client()
     bucket = client.bucket(bucket_name)
 
-    blobs = bucket.list_blobs(prefix=prefix)
-    urls = []
-
-    for blob in blobs:
-        if blob.name.endswith('.png'):
-            # Use public URL instead of signed URL
-            url = f"https://storage.googleapis.com/{bucket_name}/{blob.name}"
-            urls.append(url)
-
-    return urls
+    # One delimited listing gives the top-level frames plus the per-video
+    # CR_{i}/ folders, which are then listed in parallel
+    top_level = bucket.list_blobs(prefix=prefix, delimiter='/', fields="items(name),prefixes,nextPageToken")
+    names = [blob.name for blob in top_level if blob.name.endswith(FRAME_EXTENSIONS)]
+    subprefixes = sorted(top_level.prefixes)
+
+    if subprefixes:
+        with ThreadPoolExecutor(max_workers=min(len(subprefixes), 16)) as executor:
+            for folder_names in executor.map(lambda p: _list_frame_names(bucket, p), subprefixes):
+                names.extend(folder_names)
+
+    # Use public URL instead of signed URL
+    url_base = f"https://storage.googleapis.com/{bucket_name}/"
+    return [url_base + name for name in names]
+
+def task_count(project):
+    """Number of tasks in the project, from its aggregate stats instead of listing every task"""
+    return project.get_params().get('task_number', 0)
+
+def delete_all_tasks(project, ls_config):
+    """Delete every task in the project with one bulk request"""
+    response = requests.post(
+        f"{ls_config['url']}/api/dm/actions",
+        params={"id": "delete_tasks", "project": ls_config['project_id']},
+        json={"selectedItems": {"all": True, "excluded": []}},
+        headers={"Authorization": f"Token {ls_config['api_key']}"}
+    )
+    if response.ok:
+        return
+
+    # Older Label Studio without the data manager actions endpoint
+    print(f"⚠️  Bulk delete unavailable ({response.status_code}), deleting tasks individually...")
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(project.delete_task, project.get_tasks_ids()))
+
+def import_tasks_batched(project, tasks, batch_size=IMPORT_BATCH_SIZE):
+    """Import tasks in fixed-size batches concurrently, returning how many were imported"""
+    batches = [tasks[i:i + batch_size] for i in range(0, len(tasks), batch_size)]
+    imported = 0
+
+    with ThreadPoolExecutor(max_workers=IMPORT_WORKERS) as executor:
+        futures = {executor.submit(project.import_tasks, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                imported += len(futures[future])
+            except Exception as e:
+                print(f"❌ Failed to import a batch of {len(futures[future])} tasks: {e}")
+
+    return imported
 
 def import_to_labelstudio(urls, ls_config, clear_existing=True):
     """Import URLs to Label Studio"""
@@ -29,26 +81,24 @@ def import_to_labelstudio(urls, ls_config, clear_existing=True):
     project = ls.get_project(ls_config['project_id'])
 
     # Handle existing tasks
-    existing_tasks = project.get_tasks()
-    if existing_tasks:
+    existing_count = task_count(project)
+    if existing_count:
         if clear_existing:
-            print(f"🗑️  Deleting {len(existing_tasks)} existing tasks...")
-            for task in existing_tasks:
-                project.delete_task(task['id'])
+            print(f"🗑️  Deleting {existing_count} existing tasks...")
+            delete_all_tasks(project, ls_config)
         else:
-            print(f"📋 Keeping {len(existing_tasks)} existing tasks")
+            print(f"📋 Keeping {existing_count} existing tasks")
 
     # Create new tasks
     tasks = [{"data": {"image": url}} for url in urls]
 
     if tasks:
         print(f"📥 Importing {len(tasks)} new images...")
-        project.import_tasks(tasks)
+        imported = import_tasks_batched(project, tasks)
 
         # Get final count
-        final_tasks = project.get_tasks()
-        print(f"✅ Total tasks in project: {len(final_tasks)}")
-        print(f"✅ Successfully imported {len(tasks)} new images to Label Studio")
+        print(f"✅ Total tasks in project: {task_count(project)}")
+        print(f"✅ Successfully imported {imported}/{len(tasks)} new images to Label Studio")
     else:
         print("❌ No images found to import")
 
@@ -59,8 +109,7 @@ def main():
     args = parser.parse_args()
 
     # Load config
-    with open("configs/config.yaml") as f:
-        config = yaml.safe_load(f)
+    config = get_config()
 
     print("🔗 Creating signed URLs...")
     urls = create_signed_urls(
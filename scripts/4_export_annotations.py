@@ -1,23 +1,71 @@
 #!/usr/bin/env python3
 # scripts/4_export_annotations.py
 
-import yaml
+import io
+import os
+import re
 import shutil
+import zipfile
+import tempfile
+import requests
 from pathlib import Path
+from urllib.parse import urlparse
 from label_studio_sdk import Client
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from pipeline_config import get_config
+from file_utils import FRAME_EXTENSIONS, count_files
+
+DOWNLOAD_WORKERS = 32
+# Exports up to this (advertised) size are unzipped straight from memory
+EXPORT_SPOOL_BYTES = 64 * 1024 * 1024
+# Label Studio prefixes exported label names (e.g. "1a2b3c4d-", "12__")
+LABEL_PREFIX_SEP = re.compile(r"[-_]")
+
+# One pooled session keeps connections alive across all requests
+http_session = requests.Session()
+http_session.mount("http://", HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS))
+http_session.mount("https://", HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS))
+
+def download_image(image_url, dest_path, chunk_size=65536):
+    """Stream an image to disk, skipping it if a copy of the same size exists"""
+    with http_session.get(image_url, stream=True, timeout=60) as response:
+        if response.status_code != 200:
+            raise IOError(f"HTTP {response.status_code}")
+
+        expected_size = response.headers.get('Content-Length')
+        if expected_size and dest_path.exists() and dest_path.stat().st_size == int(expected_size):
+            return
+
+        # Copy socket -> file in fixed-size chunks, never holding the whole image
+        response.raw.decode_content = True
+        with open(dest_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=chunk_size)
+
+def match_image_stem(label_stem, image_stems):
+    """Return the downloaded image stem a label file belongs to, or None"""
+    if label_stem in image_stems:
+        return label_stem
+    # Try each suffix after a separator, shortest prefix first
+    for match in LABEL_PREFIX_SEP.finditer(label_stem):
+        candidate = label_stem[match.end():]
+        if candidate in image_stems:
+            return candidate
+    return None
 
 def export_annotations(ls_config, output_dir):
     """Export annotations from Label Studio"""
     ls = Client(url=ls_config['url'], api_key=ls_config['api_key'])
     project = ls.get_project(ls_config['project_id'])
 
-    # Check progress
-    tasks = project.get_tasks()
-    completed = sum(1 for t in tasks if t.get('is_labeled', False))
-    total = len(tasks)
+    # Check progress from the project's aggregate counts instead of
+    # downloading the whole task list
+    stats = project.get_params()
+    completed = stats.get('num_tasks_with_annotations', 0)
+    total = stats.get('task_number', 0)
 
-    print(f"Progress: {completed}/{total} ({completed/total*100:.1f}%)")
+    print(f"Progress: {completed}/{total} ({completed/max(total, 1)*100:.1f}%)")
 
     if completed == 0:
         print("❌ No labeled tasks found")
@@ -29,8 +77,6 @@ def export_annotations(ls_config, output_dir):
     export_dir.mkdir(parents=True, exist_ok=True)
 
     # Export using API endpoint directly
-    import requests
-
     headers = {"Authorization": f"Token {ls_config['api_key']}"}
     export_url = f"{ls_config['url']}/api/projects/{ls_config['project_id']}/export"
 
@@ -39,21 +85,22 @@ def export_annotations(ls_config, output_dir):
         "download_all_tasks": "false"
     }
 
-    response = requests.get(export_url, headers=headers, params=params)
-
-    if response.status_code != 200:
-        print(f"❌ Export failed: {response.text}")
-        return None
-
-    export_result = response.content
-
-    # Save and extract
-    temp_zip = export_dir / "export.zip"
-    with open(temp_zip, 'wb') as f:
-        f.write(export_result)
-
-    shutil.unpack_archive(temp_zip, export_dir)
-    temp_zip.unlink()
+    with http_session.get(export_url, headers=headers, params=params, stream=True) as response:
+        if response.status_code != 200:
+            print(f"❌ Export failed: {response.text}")
+            return None
+
+        # Keep small exports in memory and write large or unsized ones to a
+        # temp file (SpooledTemporaryFile lacks the seekable() zipfile needs
+        # before Python 3.11)
+        size = int(response.headers.get('Content-Length') or 0)
+        spool = io.BytesIO() if 0 < size <= EXPORT_SPOOL_BYTES else tempfile.TemporaryFile()
+        with spool:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                spool.write(chunk)
+            spool.seek(0)
+            with zipfile.ZipFile(spool) as archive:
+                archive.extractall(export_dir)
 
     # Organize files
     images_dir = export_dir / "images"
@@ -61,62 +108,56 @@ def export_annotations(ls_config, output_dir):
     images_dir.mkdir(exist_ok=True)
     labels_dir.mkdir(exist_ok=True)
 
-    # Move files
-    for img_file in export_dir.glob("*.jpg"):
-        img_file.rename(images_dir / img_file.name)
-    for txt_file in export_dir.glob("*.txt"):
-        if txt_file.name != "classes.txt":
-            txt_file.rename(labels_dir / txt_file.name)
+    # Move files, sorting images and labels in a single directory pass
+    with os.scandir(export_dir) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(".jpg"):
+                os.rename(entry.path, images_dir / entry.name)
+            elif entry.name.endswith(".txt") and entry.name != "classes.txt":
+                os.rename(entry.path, labels_dir / entry.name)
 
     # Download images from tasks
     print("Downloading images...")
-    import requests
 
-    # Create mapping of task IDs to image names
+    # Create mapping of task IDs to (image URL, image name), fetching only
+    # the labeled tasks
     task_image_mapping = {}
-    for task in tasks:
-        if task.get('is_labeled', False):
-            task_id = task['id']
-            image_url = task['data']['image']
-            original_name = image_url.split('/')[-1].split('?')[0]  # Remove query params
-            task_image_mapping[task_id] = original_name
-
-    # Download images and rename labels to match
-    downloaded_images = []
-    for task in tasks:
-        if task.get('is_labeled', False):
-            task_id = task['id']
-            image_url = task['data']['image']
-            original_name = task_image_mapping[task_id]
-            base_name = original_name.replace('.png', '')
-
+    for task in project.get_labeled_tasks():
+        image_url = task['data']['image']
+        original_name = urlparse(image_url).path.rsplit('/', 1)[-1]  # Drop query params
+        task_image_mapping[task['id']] = (image_url, original_name)
+
+    # Download images concurrently and rename labels to match
+    downloaded_images = set()
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        futures = {
+            executor.submit(download_image, image_url, images_dir / original_name): original_name
+            for image_url, original_name in task_image_mapping.values()
+        }
+
+        for future in as_completed(futures):
+            original_name = futures[future]
             try:
-                # Download image
-                img_response = requests.get(image_url)
-                if img_response.status_code == 200:
-                    with open(images_dir / original_name, 'wb') as f:
-                        f.write(img_response.content)
-                    downloaded_images.append(base_name)
+                future.result()
+                downloaded_images.add(Path(original_name).stem)
             except Exception as e:
                 print(f"Failed to download {original_name}: {e}")
 
     # Rename label files to match image names
     for txt_file in labels_dir.glob("*.txt"):
-        # Find corresponding image
-        for base_name in downloaded_images:
-            if base_name in str(txt_file):
-                new_name = f"{base_name}.txt"
-                txt_file.rename(labels_dir / new_name)
-                break
-
-    print(f"✅ Exported {len(list(labels_dir.glob('*.txt')))} annotations to {export_dir}")
-    print(f"✅ Downloaded {len(list(images_dir.glob('*.png')))} images")
+        base_name = match_image_stem(txt_file.stem, downloaded_images)
+        if base_name and base_name != txt_file.stem:
+            txt_file.rename(labels_dir / f"{base_name}.txt")
+
+    print(f"✅ Exported {count_files(labels_dir, ('.txt',))} annotations to {export_dir}")
+    print(f"✅ Downloaded {count_files(images_dir, FRAME_EXTENSIONS)} images")
     return export_dir
 
 def main():
     # Load config
-    with open("configs/config.yaml") as f:
-        config = yaml.safe_load(f)
+    config = get_config()
 
     export_dir = export_annotations(config['labelstudio'], "data/annotations")
 
@@ -1,13 +1,51 @@
 # scripts/5_split_dataset.py
 
+import os
 import yaml
 import argparse
 import shutil
 import random
+import warnings
+import numpy as np
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pipeline_config import get_config
+from file_utils import is_empty_label, latest_export
 
-def split_dataset(export_dir, train_ratio=0.8, val_ratio=0.2, random_seed=42):
+LINK_MODES = ['hardlink', 'symlink', 'copy']
+
+def scan_labels(labels_dir):
+    """List label files in a directory as DirEntry objects"""
+    with os.scandir(labels_dir) as entries:
+        return [e for e in entries if e.name.endswith('.txt') and e.is_file()]
+
+def place_file(src, dst, link_mode='hardlink'):
+    """Place src at dst as a hardlink, symlink or copy
+
+    Hardlinks fall back to symlinks (e.g. across filesystems), and symlinks
+    fall back to a plain copy, which uses copy_file_range/sendfile on Linux.
+    """
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+
+    if link_mode == 'hardlink':
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            link_mode = 'symlink'
+
+    if link_mode == 'symlink':
+        try:
+            os.symlink(src.absolute(), dst)
+            return
+        except OSError:
+            pass
+
+    shutil.copyfile(src, dst)
+
+def split_dataset(export_dir, train_ratio=0.8, val_ratio=0.2, random_seed=42, link_mode='hardlink'):
     """Split dataset into train/val folders"""
 
     # Set random seed for reproducibility
@@ -20,19 +58,21 @@ def split_dataset(export_dir, train_ratio=0.8, val_ratio=0.2, random_seed=42):
         print("❌ Images or labels directory not found in export")
         return None
 
-    # Get all image files
-    image_files = list(images_dir.glob("*.png")) + list(images_dir.glob("*.jpg"))
+    # Get all image files in one directory pass (sorted so the seeded shuffle is reproducible)
+    with os.scandir(images_dir) as entries:
+        image_files = sorted(Path(e.path) for e in entries
+                             if e.name.endswith((".png", ".jpg")) and e.is_file())
 
     if not image_files:
         print("❌ No image files found")
         return None
 
-    # Filter to only images that have corresponding labels
-    valid_pairs = []
-    for img_file in image_files:
-        label_file = labels_dir / f"{img_file.stem}.txt"
-        if label_file.exists():
-            valid_pairs.append((img_file, label_file))
+    # Filter to only images that have corresponding labels, using one
+    # listing of labels_dir instead of an exists() call per image
+    with os.scandir(labels_dir) as entries:
+        label_names = {e.name for e in entries if e.name.endswith(".txt")}
+    valid_pairs = [(img_file, labels_dir / f"{img_file.stem}.txt") for img_file in image_files
+                   if f"{img_file.stem}.txt" in label_names]
 
     if not valid_pairs:
         print("❌ No matching image-label pairs found")
@@ -59,19 +99,17 @@ def split_dataset(export_dir, train_ratio=0.8, val_ratio=0.2, random_seed=42):
     for dir_path in [train_images_dir, train_labels_dir, val_images_dir, val_labels_dir]:
         dir_path.mkdir(parents=True, exist_ok=True)
 
-    # Copy files to train set
-    print("📁 Copying training files...")
-    for i in range(train_count):
-        img_file, label_file = valid_pairs[i]
-        shutil.copy2(img_file, train_images_dir / img_file.name)
-        shutil.copy2(label_file, train_labels_dir / label_file.name)
+    # Place files into train/val sets (hardlinks by default, no data copied)
+    placements = []
+    for i, (img_file, label_file) in enumerate(valid_pairs):
+        images_dir_out, labels_dir_out = ((train_images_dir, train_labels_dir) if i < train_count
+                                          else (val_images_dir, val_labels_dir))
+        placements.append((img_file, images_dir_out / img_file.name))
+        placements.append((label_file, labels_dir_out / label_file.name))
 
-    # Copy files to validation set
-    print("📁 Copying validation files...")
-    for i in range(train_count, total):
-        img_file, label_file = valid_pairs[i]
-        shutil.copy2(img_file, val_images_dir / img_file.name)
-        shutil.copy2(label_file, val_labels_dir / label_file.name)
+    print(f"📁 Placing training and validation files ({link_mode})...")
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(lambda p: place_file(p[0], p[1], link_mode), placements))
 
     return {
         'train_count': train_count,
@@ -97,31 +135,37 @@ def create_dataset_yaml(export_dir, classes, split_info):
     print(f"📄 Created dataset.yaml")
     return dataset_yaml
 
-def analyze_split(export_dir):
+def analyze_split(export_dir, num_classes=0):
     """Analyze the class distribution in train/val splits"""
     train_labels_dir = export_dir / "train" / "labels"
     val_labels_dir = export_dir / "val" / "labels"
 
     def count_classes(labels_dir):
-        class_counts = defaultdict(int)
-        total_objects = 0
-
-        for label_file in labels_dir.glob("*.txt"):
-            with open(label_file, 'r') as f:
-                for line in f:
-                    if line.strip():
-                        class_id = int(line.split()[0])
-                        class_counts[class_id] += 1
-                        total_objects += 1
-
-        return class_counts, total_objects
-
-    train_classes, train_objects = count_classes(train_labels_dir)
-    val_classes, val_objects = count_classes(val_labels_dir)
+        counts = np.zeros(num_classes, dtype=np.int64)
+        file_count = 0
+
+        with warnings.catch_warnings():
+            # loadtxt warns on whitespace-only files; those simply add nothing
+            warnings.simplefilter("ignore", UserWarning)
+            for entry in scan_labels(labels_dir):
+                file_count += 1
+                # Empty labels (background images) need no open at all
+                if entry.stat().st_size == 0:
+                    continue
+                class_ids = np.loadtxt(entry.path, usecols=0, dtype=np.int32, ndmin=1)
+                file_counts = np.bincount(class_ids, minlength=len(counts))
+                file_counts[:len(counts)] += counts
+                counts = file_counts
+
+        class_counts = defaultdict(int, {i: int(c) for i, c in enumerate(counts) if c})
+        return class_counts, int(counts.sum()), file_count
+
+    train_classes, train_objects, train_files = count_classes(train_labels_dir)
+    val_classes, val_objects, val_files = count_classes(val_labels_dir)
 
     print(f"\n📊 Dataset Analysis:")
-    print(f"Training: {len(list(train_labels_dir.glob('*.txt')))} images, {train_objects} objects")
-    print(f"Validation: {len(list(val_labels_dir.glob('*.txt')))} images, {val_objects} objects")
+    print(f"Training: {train_files} images, {train_objects} objects")
+    print(f"Validation: {val_files} images, {val_objects} objects")
 
     if train_classes or val_classes:
         print(f"\nClass distribution:")
@@ -144,6 +188,8 @@ def main():
                        help='Random seed for reproducibility (default: 42)')
     parser.add_argument('--export-dir', type=str,
                        help='Specific export directory to split (default: latest)')
+    parser.add_argument('--link-mode', choices=LINK_MODES, default='hardlink',
+                       help='How to place files in train/val: hardlink, symlink or copy (default: hardlink)')
 
     args = parser.parse_args()
 
@@ -153,22 +199,18 @@ def main():
         return
 
     # Load config
-    with open("configs/config.yaml") as f:
-        config = yaml.safe_load(f)
+    config = get_config()
 
     # Find export directory
     if args.export_dir:
         export_dir = Path(args.export_dir)
     else:
-        annotations_dir = Path("data/annotations")
-        exports = sorted(annotations_dir.glob("export_*"))
+        export_dir = latest_export()
 
-        if not exports:
+        if not export_dir:
             print("❌ No exported annotations found")
             return
 
-        export_dir = exports[-1]
-
     if not export_dir.exists():
         print(f"❌ Export directory not found: {export_dir}")
         return
@@ -180,14 +222,10 @@ def main():
     labels_dir = export_dir / "labels"
 
     if images_dir.exists() and labels_dir.exists():
-        # Count empty labels
-        empty_count = 0
-        for label_file in labels_dir.glob("*.txt"):
-            with open(label_file, 'r') as f:
-                if not f.read().strip():
-                    empty_count += 1
-
-        total_labels = len(list(labels_dir.glob("*.txt")))
+        # Count empty labels (one stat per file; only tiny files are read)
+        label_entries = scan_labels(labels_dir)
+        empty_count = sum(1 for entry in label_entries if is_empty_label(entry))
+        total_labels = len(label_entries)
 
         if empty_count > 0:
             empty_percentage = (empty_count / total_labels * 100) if total_labels > 0 else 0
@@ -206,7 +244,8 @@ def main():
         export_dir,
         args.train_ratio,
         args.val_ratio,
-        args.seed
+        args.seed,
+        args.link_mode
     )
 
     if split_info:
@@ -214,7 +253,7 @@ def main():
         dataset_yaml = create_dataset_yaml(export_dir, config['classes'], split_info)
 
         # Analyze the split
-        analyze_split(export_dir)
+        analyze_split(export_dir, len(config['classes']))
 
         print(f"\n✅ Dataset split complete!")
         print(f"📁 Training data: {split_info['train_path']}")
@@ -1,10 +1,17 @@
 # scripts/6_train_model.py
 
 import yaml
+import os
 import argparse
 from pathlib import Path
-from ultralytics import YOLO
 import shutil
+from pipeline_config import get_config
+from file_utils import latest_export, list_exports
+from model_utils import (PRECISIONS, compile_kwargs, compile_yolo, export_engine, half_precision,
+                         install_fast_imread, resolve_model_path)
+
+# Largest mAP@50-95 drop (relative) accepted from the TensorRT engine
+MAX_ENGINE_MAP_DROP = 0.01
 
 def find_dataset_yaml(export_dir=None):
     """Find the dataset.yaml file"""
@@ -14,11 +21,8 @@ def find_dataset_yaml(export_dir=None):
             return dataset_yaml
 
     # Find latest export with dataset.yaml
-    annotations_dir = Path("data/annotations")
-    exports = sorted(annotations_dir.glob("export_*"), reverse=True)
-
-    for export in exports:
-        dataset_yaml = export / "dataset.yaml"
+    for export in reversed(list_exports()):
+        dataset_yaml = Path(export) / "dataset.yaml"
         if dataset_yaml.exists():
             return dataset_yaml
 
@@ -40,45 +44,116 @@ def create_legacy_dataset_yaml(export_dir, classes):
 
     return dataset_yaml
 
+def training_device(device):
+    """Expand 'cuda' (or a list of ids) to a GPU list so Ultralytics trains with DDP"""
+    if isinstance(device, (list, tuple)):
+        device = ",".join(str(d) for d in device)
+    elif str(device) == 'cuda':
+        import torch
+
+        # Ultralytics launches one DDP worker per listed GPU itself
+        num_gpus = torch.cuda.device_count()
+        if num_gpus > 1:
+            device = ",".join(str(i) for i in range(num_gpus))
+
+    if "," in str(device):
+        # DDP workers inherit this environment; keep NCCL's P2P/NVLink and
+        # InfiniBand paths on unless the user disabled them explicitly
+        os.environ.setdefault("NCCL_P2P_DISABLE", "0")
+        os.environ.setdefault("NCCL_IB_DISABLE", "0")
+    return device
+
 def train_model(dataset_yaml, config, output_dir):
-    """Train YOLO model"""
+    """Train YOLO model, returning (results, model) with the best weights loaded"""
+    import ultralytics.data.base
+    from ultralytics import YOLO
+
+    cpu_count = os.cpu_count() or 1
+    training_cfg = config['training']
+    device = training_device(training_cfg['device'])
+    num_gpus = len(str(device).split(","))
+
+    if num_gpus == 1:
+        # Ultralytics fills the image cache with a fixed 8-thread pool; use
+        # all cores, and decode JPEGs with libjpeg-turbo
+        ultralytics.data.base.NUM_THREADS = min(cpu_count, 32)
+        install_fast_imread()
+    else:
+        # DDP workers run a script Ultralytics generates, so patches made in
+        # this process would never reach them
+        print("ℹ️  Multi-GPU training: using Ultralytics' default image loading")
+    # Dataloader workers are per GPU process
+    workers = training_cfg.get('workers', min(cpu_count // num_gpus, 16))
+
     model = YOLO('yolov8n.pt')
 
     results = model.train(
         data=str(dataset_yaml),
-        epochs=config['training']['epochs'],
-        imgsz=config['training']['img_size'],
-        batch=config['training']['batch_size'],
-        device=config['training']['device'],
+        epochs=training_cfg['epochs'],
+        imgsz=training_cfg['img_size'],
+        batch=training_cfg['batch_size'],
+        device=device,
+        workers=workers,
+        cache=training_cfg.get('cache', False),
         project=str(output_dir),
         name='train',
         exist_ok=True
     )
 
-    return results
-
-def validate_model(model_path, dataset_yaml):
-    """Validate trained model"""
-    model = YOLO(model_path)
-    results = model.val(data=str(dataset_yaml))
-
-    print(f"\n📊 Validation Results:")
+    return results, model
+
+def validate_model(model, dataset_yaml, compile=False, half=False):
+    """Validate a trained model, given as a path or an already loaded YOLO"""
+    import torch
+    from ultralytics import YOLO
+
+    if isinstance(model, (str, Path)):
+        label = Path(model).name
+        compile = compile and Path(model).suffix == '.pt'
+        model = YOLO(str(model))
+    else:
+        label = "trained model"
+
+    # The validator builds its own backend, so only Ultralytics' compile=
+    # argument can compile it
+    extra = {}
+    if compile:
+        extra = compile_kwargs()
+        if extra is None:
+            print("⚠️  This Ultralytics version cannot compile validation, running eager")
+            extra = {}
+
+    with torch.inference_mode():
+        results = model.val(data=str(dataset_yaml), half=half, **extra)
+
+    print(f"\n📊 Validation Results ({label}):")
     print(f"mAP@50: {results.box.map50:.3f}")
     print(f"mAP@50-95: {results.box.map:.3f}")
     print(f"Precision: {results.box.mp:.3f}")
     print(f"Recall: {results.box.mr:.3f}")
 
-def detect_images(model_path, source_dir, output_dir):
-    """Run detection on images"""
-    model = YOLO(model_path)
+    return results.box.map
 
-    results = model.predict(
-        source=str(source_dir),
-        save=True,
-        project=str(output_dir),
-        name='detect',
-        exist_ok=True
-    )
+def detect_images(model_path, source_dir, output_dir, config, compile=False, half=False):
+    """Run detection on images"""
+    import torch
+    from ultralytics import YOLO
+
+    model = YOLO(str(model_path))
+    with torch.inference_mode():
+        extra = {}
+        if compile and Path(model_path).suffix == '.pt':
+            extra = compile_yolo(model, config['training']['img_size'], config['training']['device'], half)
+
+        results = model.predict(
+            source=str(source_dir),
+            save=True,
+            project=str(output_dir),
+            name='detect',
+            exist_ok=True,
+            half=half,
+            **extra
+        )
 
     print(f"✅ Detection results saved to {output_dir}/detect/")
 
@@ -89,12 +164,18 @@ def main():
     parser.add_argument('--model', help='Model path for validate/detect')
     parser.add_argument('--source', help='Source directory for detect')
     parser.add_argument('--export-dir', help='Specific export directory to use')
+    parser.add_argument('--compile', action='store_true',
+                       help='torch.compile the model for validate/detect (slow first call)')
+    parser.add_argument('--precision', choices=PRECISIONS, default='int8',
+                       help='TensorRT engine precision exported after training')
+    parser.add_argument('--inference-precision', choices=['fp32', 'fp16'], default='fp16',
+                       help='PyTorch validate/detect precision (fp16 only applies on CUDA)')
 
     args = parser.parse_args()
 
     # Load config
-    with open("configs/config.yaml") as f:
-        config = yaml.safe_load(f)
+    config = get_config()
+    half = half_precision(args.inference_precision)
 
     if args.mode == 'train':
         # Find dataset.yaml
@@ -102,19 +183,16 @@ def main():
 
         if not dataset_yaml:
             # Try to find latest export and check if it needs splitting
-            annotations_dir = Path("data/annotations")
-            exports = sorted(annotations_dir.glob("export_*"))
+            export_dir = latest_export()
 
-            if not exports:
+            if not export_dir:
                 print("❌ No exported annotations found")
                 return
 
-            latest_export = exports[-1]
-
             # Check if it has train/val structure
-            if (latest_export / "train").exists() and (latest_export / "val").exists():
+            if (export_dir / "train").exists() and (export_dir / "val").exists():
                 # Has split structure but no dataset.yaml - create it
-                dataset_yaml = create_dataset_yaml(latest_export, config['classes'])
+                dataset_yaml = create_dataset_yaml(export_dir, config['classes'])
             else:
                 print("⚠️  Export found but not split into train/val folders")
                 print("🔧 Please run: python scripts/5_split_dataset.py")
@@ -127,20 +205,42 @@ def main():
 
         # Train
         print("🚀 Starting training...")
-        results = train_model(dataset_yaml, config, Path("models"))
+        results, model = train_model(dataset_yaml, config, Path("models"))
 
         # Copy best model
         best_model = Path("models/train/weights/best.pt")
         final_model = Path("models/best.pt")
         shutil.copy(best_model, final_model)
 
+        # An engine from a previous run no longer matches these weights and
+        # would otherwise be preferred by validate/detect/7_test_model.py
+        final_model.with_suffix('.engine').unlink(missing_ok=True)
+
         print(f"✅ Training complete! Model saved to {final_model}")
 
-        # Auto-validate
-        validate_model(final_model, dataset_yaml)
+        # Auto-validate the in-memory model; it already holds best.pt on-device.
+        # Measure in FP32, since this is the reference the engine is checked against
+        pt_map = validate_model(model, dataset_yaml, args.compile)
+
+        # Export a TensorRT engine and keep it only if accuracy holds
+        try:
+            engine_model = export_engine(final_model, dataset_yaml,
+                                         config['training']['img_size'], args.precision)
+        except Exception as e:
+            print(f"⚠️  TensorRT export failed: {e}")
+            engine_model = None
+
+        if engine_model:
+            engine_map = validate_model(engine_model, dataset_yaml)
+            if pt_map - engine_map > MAX_ENGINE_MAP_DROP * pt_map:
+                print(f"⚠️  {args.precision} engine loses too much mAP "
+                      f"({pt_map:.3f} → {engine_map:.3f}), discarding it")
+                engine_model.unlink()
+            else:
+                print(f"✅ TensorRT {args.precision} engine saved to {engine_model}")
 
     elif args.mode == 'validate':
-        model_path = args.model or "models/best.pt"
+        model_path = resolve_model_path(args.model or "models/best.pt")
 
         # Find dataset
         dataset_yaml = find_dataset_yaml(args.export_dir)
@@ -149,13 +249,13 @@ def main():
             print("❌ No dataset.yaml found. Please run training first or split your dataset.")
             return
 
-        validate_model(model_path, dataset_yaml)
+        validate_model(model_path, dataset_yaml, args.compile, half)
 
     elif args.mode == 'detect':
-        model_path = args.model or "models/best.pt"
+        model_path = resolve_model_path(args.model or "models/best.pt")
         source_dir = args.source or "data/frames"
 
-        detect_images(model_path, source_dir, Path("runs"))
+        detect_images(model_path, source_dir, Path("runs"), config, args.compile, half)
 
 def create_dataset_yaml(export_dir, classes):
     """Create dataset.yaml for properly split dataset"""
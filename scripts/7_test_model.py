@@ -1,15 +1,18 @@
 # scripts/7_test_model.py
 
-import yaml
+import os
 import argparse
 import json
-import cv2
 import numpy as np
 from pathlib import Path
-from ultralytics import YOLO
 from datetime import datetime
-import matplotlib.pyplot as plt
-import seaborn as sns
+from pipeline_config import get_config
+from model_utils import JPEG_SUFFIXES, compile_yolo, half_precision, imread, resolve_model_path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 def load_test_images(source_path):
     """Load test images from directory"""
@@ -18,64 +21,93 @@ def load_test_images(source_path):
     if source_path.is_file():
         return [source_path]
 
-    extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp']
-    images = []
-    for ext in extensions:
-        images.extend(source_path.glob(ext))
-        images.extend(source_path.glob(ext.upper()))
+    # One directory pass, matching extensions case-insensitively
+    extensions = {'.jpg', '.jpeg', '.png', '.bmp'}
+    with os.scandir(source_path) as entries:
+        images = [Path(e.path) for e in entries
+                  if e.is_file() and os.path.splitext(e.name)[1].lower() in extensions]
 
     return sorted(images)
 
-def run_inference(model, image_paths, conf_threshold=0.25):
-    """Run inference on test images"""
+def run_inference(model, image_paths, conf_threshold=0.25, batch=32, half=False, extra=None):
+    """Run batched inference on test images (extra: additional predict() kwargs)"""
+    import torch
+
     results = []
 
-    for img_path in image_paths:
-        # Run prediction
-        pred = model.predict(
-            source=str(img_path),
+    with torch.inference_mode():
+        # One streamed predict call batches preprocessing and the forward pass
+        preds = model.predict(
+            source=[str(p) for p in image_paths],
             conf=conf_threshold,
+            batch=batch,
+            half=half,
+            stream=True,
             save=False,
-            verbose=False
-        )[0]
-
-        # Extract results
-        boxes = pred.boxes
-        if boxes is not None:
-            detections = []
-            for i in range(len(boxes)):
-                det = {
-                    'bbox': boxes.xyxy[i].cpu().numpy().tolist(),
-                    'confidence': float(boxes.conf[i].cpu()),
-                    'class': int(boxes.cls[i].cpu()),
-                    'class_name': model.names[int(boxes.cls[i].cpu())]
-                }
-                detections.append(det)
-        else:
-            detections = []
-
-        results.append({
-            'image': str(img_path),
-            'detections': detections,
-            'detection_count': len(detections)
-        })
+            verbose=False,
+            **(extra or {})
+        )
+
+        # Take the path from each prediction: the loader skips unreadable
+        # images, so zipping against image_paths would misalign results
+        for pred in preds:
+            # Extract results with one device-to-host copy per image;
+            # boxes.data rows are [x1, y1, x2, y2, conf, cls]
+            boxes = pred.boxes
+            if boxes is not None and len(boxes):
+                data = boxes.data.cpu().numpy()
+            else:
+                data = np.empty((0, 6), dtype=np.float32)
+
+            results.append(detection_result(pred.path, data))
 
     return results
 
+def detection_result(image_path, data):
+    """Per-image result from an (N, 6) [x1, y1, x2, y2, conf, cls] detection array"""
+    # Keep detections as per-image arrays rather than dicts; column slices
+    # are strided views, so copy them contiguous (orjson's numpy serializer
+    # rejects non-contiguous arrays)
+    return {
+        'image': str(Path(image_path)),
+        'boxes': np.ascontiguousarray(data[:, :4]),
+        'conf': np.ascontiguousarray(data[:, 4]),
+        'cls': data[:, 5].astype(np.int64),
+        'detection_count': len(data)
+    }
+
+def save_raw_results(results, path, classes):
+    """Write one JSON line per image, using orjson when available"""
+    names = np.array(classes, dtype=object)  # class id -> name via one fancy-index
+    with open(path, 'wb') as f:
+        for r in results:
+            record = {
+                'image': r['image'],
+                'boxes': r['boxes'],
+                'conf': r['conf'],
+                'cls': r['cls'],
+                'class_names': names[r['cls']].tolist(),
+                'detection_count': r['detection_count']
+            }
+            if orjson is not None:
+                f.write(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY))
+            else:
+                for key in ('boxes', 'conf', 'cls'):
+                    record[key] = record[key].tolist()
+                f.write(json.dumps(record).encode())
+            f.write(b'\n')
+
 def analyze_results(results, classes):
     """Analyze detection results"""
     total_images = len(results)
     images_with_detections = sum(1 for r in results if r['detection_count'] > 0)
     total_detections = sum(r['detection_count'] for r in results)
 
-    # Class distribution
-    class_counts = {cls: 0 for cls in classes}
-    confidence_scores = []
-
-    for result in results:
-        for det in result['detections']:
-            class_counts[det['class_name']] += 1
-            confidence_scores.append(det['confidence'])
+    # Class distribution and confidences over all detections at once
+    all_conf = np.concatenate([r['conf'] for r in results]) if results else np.empty(0)
+    all_cls = np.concatenate([r['cls'] for r in results]) if results else np.empty(0, dtype=np.int64)
+    class_counts = dict(zip(classes, np.bincount(all_cls, minlength=len(classes)).tolist()))
+    confidence_scores = all_conf
 
     analysis = {
         'total_images': total_images,
@@ -85,24 +117,23 @@ def analyze_results(results, classes):
         'avg_detections_per_image': total_detections / total_images if total_images > 0 else 0,
         'class_distribution': class_counts,
         'confidence_stats': {
-            'mean': np.mean(confidence_scores) if confidence_scores else 0,
-            'std': np.std(confidence_scores) if confidence_scores else 0,
-            'min': np.min(confidence_scores) if confidence_scores else 0,
-            'max': np.max(confidence_scores) if confidence_scores else 0
+            'mean': float(confidence_scores.mean()) if confidence_scores.size else 0,
+            'std': float(confidence_scores.std()) if confidence_scores.size else 0,
+            'min': float(confidence_scores.min()) if confidence_scores.size else 0,
+            'max': float(confidence_scores.max()) if confidence_scores.size else 0
         }
     }
 
     return analysis
 
-def create_test_report(results, analysis, output_dir, model_path):
+def create_test_report(results, analysis, output_dir, model_path, classes):
     """Create detailed test report"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     report_dir = output_dir / f"test_report_{timestamp}"
     report_dir.mkdir(parents=True, exist_ok=True)
 
     # Save raw results
-    with open(report_dir / "raw_results.json", 'w') as f:
-        json.dump(results, f, indent=2)
+    save_raw_results(results, report_dir / "raw_results.jsonl", classes)
 
     # Create summary report
     report_text = f"""# Model Test Report
@@ -132,14 +163,15 @@ Model: {model_path}
     # Low confidence detections
     low_conf_threshold = 0.5
     low_conf_detections = []
+    names = np.array(classes, dtype=object)
     for result in results:
-        for det in result['detections']:
-            if det['confidence'] < low_conf_threshold:
-                low_conf_detections.append({
-                    'image': Path(result['image']).name,
-                    'class': det['class_name'],
-                    'confidence': det['confidence']
-                })
+        low = result['conf'] < low_conf_threshold
+        for conf, name in zip(result['conf'][low].tolist(), names[result['cls'][low]].tolist()):
+            low_conf_detections.append({
+                'image': Path(result['image']).name,
+                'class': name,
+                'confidence': conf
+            })
 
     if low_conf_detections:
         report_text += f"\n## Low Confidence Detections (< {low_conf_threshold})\n"
@@ -160,71 +192,85 @@ Model: {model_path}
 
 def create_visualizations(results, analysis, report_dir):
     """Create visualization plots"""
+    import matplotlib
+    matplotlib.use('Agg')  # Files only; skip GUI backend negotiation
+    import matplotlib.pyplot as plt
+
+    # One figure, cleared and reused for every plot
+    fig, ax = plt.subplots(figsize=(10, 6))
 
     # Confidence distribution
-    confidence_scores = []
-    for result in results:
-        for det in result['detections']:
-            confidence_scores.append(det['confidence'])
-
-    if confidence_scores:
-        plt.figure(figsize=(10, 6))
-        plt.hist(confidence_scores, bins=20, alpha=0.7, edgecolor='black')
-        plt.xlabel('Confidence Score')
-        plt.ylabel('Frequency')
-        plt.title('Detection Confidence Distribution')
-        plt.grid(True, alpha=0.3)
-        plt.savefig(report_dir / "confidence_distribution.png", dpi=300, bbox_inches='tight')
-        plt.close()
+    confidence_scores = np.concatenate([r['conf'] for r in results]) if results else np.empty(0)
+
+    if confidence_scores.size:
+        ax.hist(confidence_scores, bins=20, alpha=0.7, edgecolor='black')
+        ax.set_xlabel('Confidence Score')
+        ax.set_ylabel('Frequency')
+        ax.set_title('Detection Confidence Distribution')
+        ax.grid(True, alpha=0.3)
+        fig.savefig(report_dir / "confidence_distribution.png", dpi=150, bbox_inches='tight')
 
     # Class distribution
     class_counts = analysis['class_distribution']
     if any(count > 0 for count in class_counts.values()):
-        plt.figure(figsize=(10, 6))
+        ax.clear()
         classes = list(class_counts.keys())
         counts = list(class_counts.values())
 
-        plt.bar(classes, counts)
-        plt.xlabel('Class')
-        plt.ylabel('Detection Count')
-        plt.title('Class Distribution in Test Set')
-        plt.xticks(rotation=45)
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(report_dir / "class_distribution.png", dpi=300, bbox_inches='tight')
-        plt.close()
+        ax.bar(classes, counts)
+        ax.set_xlabel('Class')
+        ax.set_ylabel('Detection Count')
+        ax.set_title('Class Distribution in Test Set')
+        ax.tick_params(axis='x', rotation=45)
+        ax.grid(True, alpha=0.3)
+        fig.tight_layout()
+        fig.savefig(report_dir / "class_distribution.png", dpi=150, bbox_inches='tight')
 
     # Detection rate by image
     detection_counts = [r['detection_count'] for r in results]
-    plt.figure(figsize=(12, 6))
-    plt.plot(detection_counts, marker='o', alpha=0.7)
-    plt.xlabel('Image Index')
-    plt.ylabel('Detection Count')
-    plt.title('Detections per Image')
-    plt.grid(True, alpha=0.3)
-    plt.savefig(report_dir / "detections_per_image.png", dpi=300, bbox_inches='tight')
-    plt.close()
-
-def save_annotated_images(model, image_paths, output_dir, conf_threshold=0.25, max_images=50):
-    """Save annotated images with detections"""
+    ax.clear()
+    fig.set_size_inches(12, 6)
+    ax.plot(detection_counts, marker='o', alpha=0.7)
+    ax.set_xlabel('Image Index')
+    ax.set_ylabel('Detection Count')
+    ax.set_title('Detections per Image')
+    ax.grid(True, alpha=0.3)
+    fig.savefig(report_dir / "detections_per_image.png", dpi=150, bbox_inches='tight')
+    plt.close(fig)
+
+def class_palette(num_classes, seed=0):
+    """Fixed BGR colour per class id"""
+    rng = np.random.default_rng(seed)
+    return [tuple(int(c) for c in color) for color in rng.integers(64, 256, size=(num_classes, 3))]
+
+def save_annotated_images(results, output_dir, classes, max_images=50):
+    """Save annotated images, drawing the detections run_inference already found"""
+    import cv2
+
     annotated_dir = output_dir / "annotated_images"
     annotated_dir.mkdir(exist_ok=True)
 
     # Limit number of images to avoid too many files
-    selected_images = image_paths[:max_images] if len(image_paths) > max_images else image_paths
+    selected_results = results[:max_images]
+    palette = class_palette(len(classes))
 
-    for img_path in selected_images:
-        # Run prediction with save=True
-        results = model.predict(
-            source=str(img_path),
-            conf=conf_threshold,
-            save=True,
-            project=str(annotated_dir),
-            name='',
-            exist_ok=True
-        )
+    for result in selected_results:
+        img = imread(result['image'])
+        if img is None:
+            continue
+
+        boxes = result['boxes'].astype(np.int32).tolist()
+        for (x1, y1, x2, y2), conf, cls in zip(boxes, result['conf'].tolist(), result['cls'].tolist()):
+            color = palette[cls]
+            cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(img, f"{classes[cls]} {conf:.2f}", (x1, max(y1 - 6, 12)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+
+        out_path = annotated_dir / Path(result['image']).name
+        params = [cv2.IMWRITE_JPEG_QUALITY, 90] if out_path.suffix.lower() in JPEG_SUFFIXES else []
+        cv2.imwrite(str(out_path), img, params)
 
-    print(f"📸 Saved {len(selected_images)} annotated images to {annotated_dir}")
+    print(f"📸 Saved {len(selected_results)} annotated images to {annotated_dir}")
 
 def main():
     parser = argparse.ArgumentParser(description='Test YOLO model on new images')
@@ -240,22 +286,38 @@ def main():
                        help='Save annotated images with detections')
     parser.add_argument('--max-images', type=int, default=300,
                        help='Maximum images to save (for annotated output)')
+    parser.add_argument('--batch', type=int, default=32,
+                       help='Inference batch size')
+    parser.add_argument('--compile', action='store_true',
+                       help='torch.compile the model before inference (slow first call)')
+    parser.add_argument('--precision', choices=['fp32', 'fp16'], default='fp16',
+                       help='PyTorch inference precision (fp16 only applies on CUDA)')
 
     args = parser.parse_args()
 
-    # Check model exists
-    model_path = Path(args.model)
+    # Check model exists, preferring an exported TensorRT engine
+    model_path = resolve_model_path(args.model)
     if not model_path.exists():
         print(f"❌ Model not found: {model_path}")
         return
 
-    # Load model
+    # Load model; heavy imports wait until argument parsing succeeded
+    from ultralytics import YOLO
+
     print(f"🔧 Loading model: {model_path}")
     model = YOLO(str(model_path))
 
-    # Load config for class names
-    with open("configs/config.yaml") as f:
-        config = yaml.safe_load(f)
+    # Class names come from the model itself (as a dense list, for indexing
+    # by class id); the config only supplies image size and device
+    class_names = [model.names[i] for i in range(len(model.names))]
+    config = get_config()
+
+    half = half_precision(args.precision)
+    extra = {}
+    if args.compile and model_path.suffix == '.pt':
+        print("⚙️  Compiling model (first call takes a while)...")
+        extra = compile_yolo(model, config['training']['img_size'], config['training']['device'],
+                             half, args.batch)
 
     # Load test images
     print(f"📁 Loading test images from: {args.source}")
@@ -269,10 +331,10 @@ def main():
 
     # Run inference
     print(f"🔍 Running inference (conf={args.conf})...")
-    results = run_inference(model, image_paths, args.conf)
+    results = run_inference(model, image_paths, args.conf, args.batch, half, extra)
 
     # Analyze results
-    analysis = analyze_results(results, config['classes'])
+    analysis = analyze_results(results, class_names)
 
     # Create output directory
     output_dir = Path(args.output)
@@ -280,14 +342,14 @@ def main():
 
     # Generate report
     print(f"📊 Generating test report...")
-    report_dir = create_test_report(results, analysis, output_dir, model_path)
+    report_dir = create_test_report(results, analysis, output_dir, model_path, class_names)
 
     # Create visualizations
     create_visualizations(results, analysis, report_dir)
 
     # Save annotated images if requested
     if args.save_images:
-        save_annotated_images(model, image_paths, report_dir, args.conf, args.max_images)
+        save_annotated_images(results, report_dir, class_names, args.max_images)
 
     # Print summary
     print(f"\n📈 Test Results Summary:")
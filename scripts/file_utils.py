@@ -0,0 +1,58 @@
+# scripts/file_utils.py
+
+import os
+from pathlib import Path
+
+ANNOTATIONS_DIR = "data/annotations"
+
+# Video containers frame extraction accepts (matched case-insensitively)
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.avi')
+
+# Frames are extracted as JPEG; PNG is still accepted for older extractions
+FRAME_EXTENSIONS = ('.jpg', '.png')
+
+# Labels start with a class id, so a small prefix almost always settles
+# whether a label file has content
+LABEL_PREFIX_BYTES = 64
+
+def count_files(path, suffixes, recursive=False):
+    """Count files with the given suffixes (any case) without building Path lists"""
+    if not os.path.isdir(path):
+        return 0
+
+    if recursive:
+        return sum(1 for _, _, files in os.walk(path)
+                   for name in files if name.lower().endswith(suffixes))
+
+    with os.scandir(path) as entries:
+        return sum(1 for e in entries if e.name.lower().endswith(suffixes) and e.is_file())
+
+def is_empty_label(entry):
+    """Check if a label DirEntry is empty or whitespace-only
+
+    Zero-byte files are decided by the cached stat; others read a short
+    prefix, and the rest of the file only if that prefix is blank.
+    """
+    if entry.stat().st_size == 0:
+        return True
+    with open(entry.path, 'rb') as f:
+        if f.read(LABEL_PREFIX_BYTES).strip():
+            return False
+        return not f.read().strip()
+
+def list_exports(annotations_dir=ANNOTATIONS_DIR):
+    """Export directory paths, oldest first (names embed their timestamp)"""
+    if not os.path.isdir(annotations_dir):
+        return []
+    with os.scandir(annotations_dir) as entries:
+        return sorted(e.path for e in entries
+                      if e.name.startswith("export_") and e.is_dir())
+
+def latest_export(annotations_dir=ANNOTATIONS_DIR):
+    """Newest export directory in a single scan, or None if there is none"""
+    if not os.path.isdir(annotations_dir):
+        return None
+    with os.scandir(annotations_dir) as entries:
+        latest = max((e.path for e in entries
+                      if e.name.startswith("export_") and e.is_dir()), default=None)
+    return Path(latest) if latest else None
@@ -0,0 +1,163 @@
+# scripts/model_utils.py
+
+import io
+import threading
+import numpy as np
+from pathlib import Path
+
+PRECISIONS = ['fp32', 'fp16', 'int8']
+JPEG_SUFFIXES = ('.jpg', '.jpeg')
+EXIF_ORIENTATION_TAG = 0x0112
+COMPILE_MODE = "reduce-overhead"
+
+# TurboJPEG handles are not shared between threads
+_turbo = threading.local()
+
+def _turbojpeg():
+    """Per-thread TurboJPEG decoder, or None if PyTurboJPEG/libturbojpeg is missing"""
+    if not hasattr(_turbo, 'jpeg'):
+        try:
+            from turbojpeg import TurboJPEG
+            _turbo.jpeg = TurboJPEG()
+        except (ImportError, OSError, RuntimeError):
+            _turbo.jpeg = None
+    return _turbo.jpeg
+
+def _exif_orientation(data):
+    """EXIF orientation of an encoded image (1 = upright), parsed from its header only"""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            return im.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    except Exception:
+        return 1
+
+def imread(path, flags=None):
+    """cv2.imread drop-in (BGR) that decodes JPEGs with libjpeg-turbo when available
+
+    Files are read in Python and decoded with cv2.imdecode, like Ultralytics'
+    own imread, so non-ASCII paths work. TurboJPEG does not apply EXIF
+    orientation, so rotated JPEGs go through OpenCV, which does.
+    """
+    import cv2
+
+    flags = cv2.IMREAD_COLOR if flags is None else flags
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    jpeg = _turbojpeg() if flags == cv2.IMREAD_COLOR else None
+    if (jpeg is not None and str(path).lower().endswith(JPEG_SUFFIXES)
+            and _exif_orientation(data) == 1):
+        try:
+            return jpeg.decode(data)
+        except OSError:
+            pass  # Let OpenCV decode (or report) anything libjpeg-turbo rejects
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+def install_fast_imread():
+    """Route Ultralytics' dataset image loading through imread()"""
+    import ultralytics.data.base
+
+    if hasattr(ultralytics.data.base, 'imread'):
+        ultralytics.data.base.imread = imread
+
+def compile_kwargs():
+    """predict()/val() kwargs that make Ultralytics torch.compile the model itself, or None
+
+    Ultralytics 8.3.x+ accepts compile= and compiles the network inside the
+    predictor/validator it builds; older versions have no such argument.
+    """
+    from ultralytics.cfg import DEFAULT_CFG_DICT
+
+    if 'compile' in DEFAULT_CFG_DICT:
+        return {'compile': COMPILE_MODE}
+    return None
+
+def compile_yolo(model, imgsz=640, device=None, half=False, batch=1):
+    """Set a YOLO model up for compiled inference, returning extra predict() kwargs
+
+    Without Ultralytics' own compile= support, the network is compiled on the
+    predictor's AutoBackend: the backend fuses model.model when it is built,
+    which would unwrap a module compiled beforehand. The predictor is reused
+    by later predict() calls and keeps the precision it was built with, so
+    pass the half/batch real inference uses.
+    """
+    kwargs = compile_kwargs()
+    if kwargs is not None:
+        return kwargs
+
+    import torch
+    from torch._dynamo.utils import counters
+
+    dummy = [np.zeros((imgsz, imgsz, 3), dtype=np.uint8)] * batch
+
+    def warmup():
+        model.predict(dummy, imgsz=imgsz, device=device, half=half, batch=batch,
+                      verbose=False)
+
+    # Compile and warm up under inference_mode, the same context the
+    # compiled model is later called in; mixing the two makes it slower
+    with torch.inference_mode():
+        # The first call builds the predictor and its fused backend
+        warmup()
+        backend = model.predictor.model
+        backend.model = torch.compile(backend.model, mode=COMPILE_MODE,
+                                      fullgraph=False, dynamic=False)
+
+        # The next call triggers compilation; pay it here at a fixed imgsz
+        graphs_before = counters["stats"]["unique_graphs"]
+        warmup()
+
+    if counters["stats"]["unique_graphs"] == graphs_before:
+        print("⚠️  torch.compile produced no graphs, inference stays eager")
+    return {}
+
+def half_precision(precision):
+    """Whether PyTorch inference should run in FP16; always False without CUDA"""
+    import torch
+
+    return precision != 'fp32' and torch.cuda.is_available()
+
+def resolve_model_path(model_path):
+    """Prefer a TensorRT engine exported next to a .pt checkpoint, unless the checkpoint is newer"""
+    model_path = Path(model_path)
+    engine_path = model_path.with_suffix('.engine')
+    if model_path.suffix == '.pt' and engine_path.exists():
+        if not model_path.exists() or engine_path.stat().st_mtime_ns >= model_path.stat().st_mtime_ns:
+            return engine_path
+    return model_path
+
+def export_engine(model_path, dataset_yaml, imgsz, precision='int8', batch=32):
+    """Export a checkpoint to a TensorRT engine, or return None without CUDA"""
+    import torch
+    from ultralytics import YOLO
+
+    if not torch.cuda.is_available():
+        print("⚠️  No CUDA device, skipping TensorRT export")
+        return None
+
+    # Reduced precision needs Tensor Cores (Ampere+) to pay off
+    major, minor = torch.cuda.get_device_capability()
+    if precision != 'fp32' and major < 8:
+        print(f"⚠️  GPU compute capability {major}.{minor} may not benefit from {precision}")
+
+    # INT8 calibrates on images from dataset_yaml; dynamic lets the last,
+    # partial batch run through an engine built for up to `batch` images;
+    # simplify folds constants/BN in the intermediate ONNX graph first
+    engine_path = YOLO(str(model_path)).export(
+        format='engine',
+        half=precision == 'fp16',
+        int8=precision == 'int8',
+        data=str(dataset_yaml),
+        imgsz=imgsz,
+        batch=batch,
+        dynamic=True,
+        simplify=True,
+        workspace=4
+    )
+
+    return Path(engine_path)
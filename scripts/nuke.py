@@ -1,8 +1,10 @@
 # scripts/nuke.py
 
+import os
 import shutil
 import argparse
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 def get_directories_to_delete():
     """Get list of directories that will be deleted"""
@@ -15,62 +17,85 @@ def get_directories_to_delete():
         "test_results"
     ]
 
-def calculate_deletion_size():
-    """Calculate total size of files to be deleted"""
-    total_size = 0
+def scan_directory(root):
+    """Return (file_count, total_bytes) under root using one scandir walk"""
     file_count = 0
-
-    for dir_path in get_directories_to_delete():
-        path = Path(dir_path)
-        if path.exists():
-            for file_path in path.rglob("*"):
-                if file_path.is_file():
-                    total_size += file_path.stat().st_size
+    total_size = 0
+    stack = [root]
+
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total_size += entry.stat(follow_symlinks=False).st_size
                     file_count += 1
 
-    # Convert to MB
-    size_mb = total_size / (1024 * 1024)
-    return file_count, size_mb
+    return file_count, total_size
+
+def calculate_deletion_size():
+    """Scan each directory once: {dir: (file_count, bytes) or None if missing}"""
+    return {
+        dir_path: scan_directory(dir_path) if os.path.isdir(dir_path) else None
+        for dir_path in get_directories_to_delete()
+    }
 
 def show_deletion_preview():
     """Show what will be deleted"""
     print("🗑️  NUKE OPERATION - DELETION PREVIEW:")
     print("=" * 50)
 
-    file_count, size_mb = calculate_deletion_size()
+    dir_stats = calculate_deletion_size()
 
-    for dir_path in get_directories_to_delete():
-        path = Path(dir_path)
-        if path.exists():
-            files = list(path.rglob("*"))
-            file_count_dir = len([f for f in files if f.is_file()])
-            print(f"📁 {dir_path}: {file_count_dir} files")
+    for dir_path, stats in dir_stats.items():
+        if stats is not None:
+            print(f"📁 {dir_path}: {stats[0]} files")
         else:
             print(f"📁 {dir_path}: not found")
 
+    found = [stats for stats in dir_stats.values() if stats is not None]
+    file_count = sum(count for count, _ in found)
+    # Convert to MB
+    size_mb = sum(size for _, size in found) / (1024 * 1024)
+
     print("=" * 50)
     print(f"📊 TOTAL: {file_count} files ({size_mb:.1f} MB)")
     print("=" * 50)
 
+def _delete_tree(path):
+    """rmtree one directory, returning the exception instead of raising it"""
+    try:
+        shutil.rmtree(path)
+        return None
+    except Exception as e:
+        return e
+
 def nuke_directories(dry_run=False):
     """Delete all data directories"""
     deleted_dirs = []
+    existing_dirs = []
 
     for dir_path in get_directories_to_delete():
-        path = Path(dir_path)
-        if path.exists():
+        if Path(dir_path).exists():
+            existing_dirs.append(dir_path)
             if dry_run:
                 print(f"[DRY RUN] Would delete: {dir_path}")
-            else:
-                try:
-                    shutil.rmtree(path)
-                    print(f"✅ Deleted: {dir_path}")
-                    deleted_dirs.append(dir_path)
-                except Exception as e:
-                    print(f"❌ Failed to delete {dir_path}: {e}")
         else:
             print(f"⏭️  Skipped: {dir_path} (not found)")
 
+    if dry_run or not existing_dirs:
+        return deleted_dirs
+
+    # The trees are independent and rmtree is syscall-bound, so delete them concurrently
+    with ThreadPoolExecutor(max_workers=len(existing_dirs)) as executor:
+        for dir_path, error in zip(existing_dirs, executor.map(_delete_tree, existing_dirs)):
+            if error is None:
+                print(f"✅ Deleted: {dir_path}")
+                deleted_dirs.append(dir_path)
+            else:
+                print(f"❌ Failed to delete {dir_path}: {error}")
+
     return deleted_dirs
 
 def main():
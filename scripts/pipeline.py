@@ -1,26 +1,30 @@
 # scripts/pipeline.py
 
+import os
 import yaml
 import argparse
 import subprocess
 import sys
 from pathlib import Path
+from file_utils import VIDEO_EXTENSIONS
 
 def run_command(cmd, description):
-    """Run command and handle errors"""
+    """Run command, streaming its output live, and handle errors"""
     print(f"\n🔄 {description}")
     print(f"Running: {' '.join(cmd)}")
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # The child writes straight to our terminal, so its output (including
+    # tqdm's in-place progress bars) shows live; unbuffered keeps it in
+    # order with our own prints when the log is redirected
+    sys.stdout.flush()
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    result = subprocess.run(cmd, env=env)
 
     if result.returncode != 0:
-        print(f"❌ Failed: {description}")
-        print(f"Error: {result.stderr}")
+        print(f"❌ Failed: {description} (exit code {result.returncode})")
         return False
 
     print(f"✅ Completed: {description}")
-    if result.stdout:
-        print(result.stdout)
     return True
 
 def check_prerequisites():
@@ -41,13 +45,15 @@ def check_prerequisites():
             print(f"  - {item}")
         return False
 
-    # Check for videos
-    videos = list(Path("data/videos").glob("*.mp4"))
-    if not videos:
-        print("❌ No .mp4 files found in data/videos/")
+    # Check for videos (same extensions 1_extract_frames.py accepts), one scandir pass
+    with os.scandir("data/videos") as entries:
+        video_count = sum(1 for e in entries
+                          if os.path.splitext(e.name)[1].lower() in VIDEO_EXTENSIONS and e.is_file())
+    if not video_count:
+        print(f"❌ No video files found in data/videos/ (supported: {', '.join(VIDEO_EXTENSIONS)})")
         return False
 
-    print(f"✅ Found {len(videos)} videos to process")
+    print(f"✅ Found {video_count} videos to process")
     return True
 
 def run_full_pipeline(args):
@@ -62,6 +68,8 @@ def run_full_pipeline(args):
         extract_cmd.extend(["--frame-skip", str(args.frame_skip)])
     if args.randomize:
         extract_cmd.append("--randomize")
+    if args.image_format:
+        extract_cmd.extend(["--format", args.image_format])
 
     if not run_command(extract_cmd, "Extracting frames from videos"):
         return False
@@ -128,6 +136,8 @@ def main():
                        help='Extract 1 frame out of every N frames')
     parser.add_argument('--randomize', action='store_true',
                        help='Randomize frame filenames')
+    parser.add_argument('--format', choices=['jpg', 'png'], dest='image_format',
+                       help='Frame image format (default from config)')
     parser.add_argument('--flat', action='store_true',
                        help='Upload files flat (no folder structure)')
     parser.add_argument('--keep-existing', action='store_true',
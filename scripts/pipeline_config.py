@@ -0,0 +1,18 @@
+# scripts/pipeline_config.py
+
+import yaml
+from functools import lru_cache
+
+# libyaml-backed loader is much faster than the pure-Python one
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+CONFIG_PATH = "configs/config.yaml"
+
+@lru_cache(maxsize=None)
+def get_config(path=CONFIG_PATH):
+    """Load the pipeline config once per process"""
+    with open(path) as f:
+        return yaml.load(f, Loader=SafeLoader)
@@ -1,59 +1,96 @@
 # scripts/sanitize.py
 
+import os
 import argparse
 import random
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from file_utils import is_empty_label, latest_export
+
+# Image extensions in lookup priority order when several share a stem
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg']
+
+DELETE_WORKERS = 16
+
+def _sorted_pairs(image_paths, label_paths):
+    """Sort parallel image/label path lists by image path"""
+    order = sorted(range(len(image_paths)), key=image_paths.__getitem__)
+    return [image_paths[i] for i in order], [label_paths[i] for i in order]
 
 def find_labeled_and_empty_pairs(export_dir):
-    """Find both labeled and empty image/label pairs"""
+    """Find labeled and empty pairs, each as parallel (image_paths, label_paths) string lists"""
     images_dir = export_dir / "images"
     labels_dir = export_dir / "labels"
 
     if not images_dir.exists() or not labels_dir.exists():
         print("❌ Images or labels directory not found")
-        return [], []
-
-    labeled_pairs = []
-    empty_pairs = []
+        return ([], []), ([], [])
+
+    # Map image stem -> path in one directory pass instead of probing
+    # each candidate extension with exists()
+    priority = {ext: i for i, ext in enumerate(IMAGE_EXTENSIONS)}
+    images_by_stem = {}
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext not in priority:
+                continue
+            current = images_by_stem.get(stem)
+            if current is None or priority[ext] < priority[os.path.splitext(current)[1]]:
+                images_by_stem[stem] = entry.path
+
+    labeled_images, labeled_labels = [], []
+    empty_images, empty_labels = [], []
 
     # Check all label files
-    for label_file in labels_dir.glob("*.txt"):
-        # Check if file is empty or contains only whitespace
-        with open(label_file, 'r') as f:
-            content = f.read().strip()
-
-        # Find corresponding image
-        image_extensions = ['.png', '.jpg', '.jpeg']
-        image_file = None
-        for ext in image_extensions:
-            potential_image = images_dir / f"{label_file.stem}{ext}"
-            if potential_image.exists():
-                image_file = potential_image
-                break
-
-        if image_file:
-            if content:  # Has labels
-                labeled_pairs.append((image_file, label_file))
+    with os.scandir(labels_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".txt"):
+                continue
+
+            # Find corresponding image
+            image_file = images_by_stem.get(entry.name[:-4])
+            if not image_file:
+                continue
+
+            if not is_empty_label(entry):
+                labeled_images.append(image_file)
+                labeled_labels.append(entry.path)
             else:  # Empty file
-                empty_pairs.append((image_file, label_file))
-
-    return labeled_pairs, empty_pairs
-
-def sanitize_dataset(export_dir, keep_percentage=25, random_seed=42):
+                empty_images.append(image_file)
+                empty_labels.append(entry.path)
+
+    # Directory order is arbitrary; sort so the seeded selection is reproducible
+    return (_sorted_pairs(labeled_images, labeled_labels),
+            _sorted_pairs(empty_images, empty_labels))
+
+def _delete_pair(image_path, label_path):
+    """Unlink an image/label pair (already-missing files are fine), returning any error"""
+    try:
+        for path in (image_path, label_path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        return None
+    except Exception as e:
+        return e
+
+def sanitize_dataset(export_dir, keep_percentage=25, random_seed=42, verify=False):
     """Remove empty label pairs based on percentage of labeled pairs"""
 
     # Set random seed for reproducibility
     random.seed(random_seed)
 
     # Find labeled and empty pairs
-    labeled_pairs, empty_pairs = find_labeled_and_empty_pairs(export_dir)
+    (labeled_images, _), (empty_images, empty_labels) = find_labeled_and_empty_pairs(export_dir)
 
-    if not empty_pairs:
+    if not empty_images:
         print("✅ No empty label files found")
         return
 
-    total_labeled = len(labeled_pairs)
-    total_empty = len(empty_pairs)
+    total_labeled = len(labeled_images)
+    total_empty = len(empty_images)
 
     # Calculate how many empty pairs to keep based on labeled count
     target_empty_count = int(total_labeled * keep_percentage / 100)
@@ -72,31 +109,37 @@ def sanitize_dataset(export_dir, keep_percentage=25, random_seed=42):
         print("✅ No files to delete")
         return
 
-    # Randomly select pairs to delete
-    random.shuffle(empty_pairs)
-    pairs_to_delete = empty_pairs[:delete_count]
+    # Randomly select pairs to delete by sampling indices into both lists
+    selected = random.sample(range(total_empty), delete_count)
+    images_to_delete = [empty_images[i] for i in selected]
+    labels_to_delete = [empty_labels[i] for i in selected]
 
-    # Delete selected pairs
+    # Delete selected pairs; unlinks are independent syscalls, so run them concurrently
     deleted_count = 0
-    for image_file, label_file in pairs_to_delete:
-        try:
-            image_file.unlink()
-            label_file.unlink()
-            deleted_count += 1
-        except Exception as e:
-            print(f"❌ Failed to delete {image_file.name}: {e}")
+    with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+        for image_file, error in zip(images_to_delete,
+                                     executor.map(_delete_pair, images_to_delete, labels_to_delete)):
+            if error is None:
+                deleted_count += 1
+            else:
+                print(f"❌ Failed to delete {os.path.basename(image_file)}: {error}")
 
     print(f"✅ Successfully deleted {deleted_count} image/label pairs")
 
-    # Show final stats
-    remaining_labeled, remaining_empty = find_labeled_and_empty_pairs(export_dir)
-    total_remaining = len(remaining_labeled) + len(remaining_empty)
-    empty_ratio = (len(remaining_empty) / len(remaining_labeled) * 100) if remaining_labeled else 0
+    # Show final stats, derived from the counts we already have; only
+    # rescan the directories when asked to verify them
+    if verify:
+        (remaining_labeled, _), (remaining_empty, _) = find_labeled_and_empty_pairs(export_dir)
+        labeled_count, empty_count = len(remaining_labeled), len(remaining_empty)
+    else:
+        labeled_count, empty_count = total_labeled, total_empty - deleted_count
+    total_remaining = labeled_count + empty_count
+    empty_ratio = (empty_count / labeled_count * 100) if labeled_count else 0
 
-    print(f"\n📈 Final Statistics:")
+    print(f"\n📈 Final Statistics{' (verified)' if verify else ''}:")
     print(f"   Total pairs: {total_remaining}")
-    print(f"   Labeled pairs: {len(remaining_labeled)}")
-    print(f"   Empty pairs: {len(remaining_empty)}")
+    print(f"   Labeled pairs: {labeled_count}")
+    print(f"   Empty pairs: {empty_count}")
     print(f"   Empty/Labeled ratio: {empty_ratio:.1f}%")
 
 def main():
@@ -109,6 +152,8 @@ def main():
                        help='Random seed for reproducibility (default: 42)')
     parser.add_argument('--dry-run', action='store_true',
                        help='Show what would be deleted without actually deleting')
+    parser.add_argument('--verify', action='store_true',
+                       help='Rescan the export after deleting to verify the final statistics')
 
     args = parser.parse_args()
 
@@ -121,15 +166,12 @@ def main():
     if args.export_dir:
         export_dir = Path(args.export_dir)
     else:
-        annotations_dir = Path("data/annotations")
-        exports = sorted(annotations_dir.glob("export_*"))
+        export_dir = latest_export()
 
-        if not exports:
+        if not export_dir:
             print("❌ No exported annotations found")
             return
 
-        export_dir = exports[-1]
-
     if not export_dir.exists():
         print(f"❌ Export directory not found: {export_dir}")
         return
@@ -146,7 +188,7 @@ def main():
         return
 
     # Perform sanitization
-    sanitize_dataset(export_dir, args.keep_percentage, args.seed)
+    sanitize_dataset(export_dir, args.keep_percentage, args.seed, args.verify)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
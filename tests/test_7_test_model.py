@@ -0,0 +1,44 @@
+# tests/test_7_test_model.py
+
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+# Numbered script names are not importable with a plain import statement
+_spec = importlib.util.spec_from_file_location("test_model", SCRIPTS_DIR / "7_test_model.py")
+test_model = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(test_model)
+
+CLASSES = ['car', 'truck']
+
+def _result(num_detections):
+    """Result as run_inference builds it from a float32 boxes.data array"""
+    data = np.array([[10, 20, 30, 40, 0.9, 1],
+                     [50, 60, 70, 80, 0.4, 0],
+                     [15, 25, 35, 45, 0.7, 1]], dtype=np.float32)[:num_detections]
+    return test_model.detection_result("frames/img_001.jpg", data)
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_save_raw_results_multiple_detections(tmp_path, monkeypatch, use_orjson):
+    if use_orjson:
+        monkeypatch.setattr(test_model, "orjson", pytest.importorskip("orjson"))
+    else:
+        monkeypatch.setattr(test_model, "orjson", None)
+
+    path = tmp_path / "raw_results.jsonl"
+    test_model.save_raw_results([_result(3), _result(0)], path, CLASSES)
+
+    first, empty = [json.loads(line) for line in path.read_text().splitlines()]
+    assert first['detection_count'] == 3
+    assert first['class_names'] == ['truck', 'car', 'truck']
+    np.testing.assert_allclose(first['boxes'][1], [50, 60, 70, 80])
+    np.testing.assert_allclose(first['conf'], [0.9, 0.4, 0.7], rtol=1e-6)
+    assert empty['detection_count'] == 0
+    assert empty['boxes'] == [] and empty['class_names'] == []